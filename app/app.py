@@ -1,15 +1,83 @@
-from flask import Flask, render_template
+import os
+import gzip
+from functools import lru_cache
+
+from flask import Flask, render_template, request, make_response
+
+from .geometry import build_geometry
+
+HISTORY_PATH = "./app/history.txt"
+READ_BLOCK_SIZE = 65536
+LSYSTEM_FIELDS = ["timestamp","variables","constants","axiom","rules","translations","iterations","resulting_string"]
 
 app = Flask(__name__)
 
+def read_recent_record():
+    """
+    Reads the most recently logged L-System record without loading the whole history file.
+
+    :return: Last line of the history file, without trailing newline
+    """
+    with open(HISTORY_PATH, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        # Skip the trailing newline, then search backwards block by block for the previous one.
+        position = end - 1 if end > 0 else 0
+        start = 0
+        while position > 0:
+            block_start = max(0, position - READ_BLOCK_SIZE)
+            f.seek(block_start)
+            newline = f.read(position - block_start).rfind(b"\n")
+            if newline != -1:
+                start = block_start + newline + 1
+                break
+            position = block_start
+        f.seek(start)
+        return f.read().decode('utf-8').rstrip("\n")
+
+def history_version():
+    """
+    Identifies the current state of the history file from its metadata, without reading it.
+
+    :return: (path, size, modification time) tuple
+    """
+    stat = os.stat(HISTORY_PATH)
+    return HISTORY_PATH, stat.st_size, stat.st_mtime_ns
+
+@lru_cache(maxsize=8)
+def encoded_geometry(version):
+    """
+    Builds, packs and compresses the geometry of the most recent record once per history version.
+
+    :param version: History version as returned by history_version()
+    :return: (recent L-System record fields, geometry, gzip-encoded payload) tuple
+    """
+    recent_lsystem = dict(zip(LSYSTEM_FIELDS, read_recent_record().split("\t")))
+    geometry = build_geometry(recent_lsystem["resulting_string"], recent_lsystem["translations"])
+    return recent_lsystem, geometry, gzip.compress(geometry.to_bytes())
+
 @app.route("/index")
 def index():
-    with open("./app/history.txt", 'r') as f:
-        lsystem_fields = ["timestamp","variables","constants","axiom","rules","translations","iterations","resulting_string"]
-        recent_lsystem = f.readlines()[-1][:-1].split("\t")
-        recent_lsystem = {k: v for k, v in zip(lsystem_fields, recent_lsystem)}
+    recent_lsystem, geometry, _ = encoded_geometry(history_version())
+
+    return render_template("index.html", recent_lsystem=recent_lsystem, palette=geometry.palette)
 
-    return render_template("index.html", recent_lsystem=recent_lsystem)
+@app.route("/geometry")
+def geometry():
+    version = history_version()
+    accepts_gzip = "gzip" in request.accept_encodings
+    etag = "{:x}-{:x}".format(*version[1:]) + ("-gzip" if accepts_gzip else "")
 
-if __name__ == "__main__":
-    app.run()
\ No newline at end of file
+    # Revalidation only needs the file metadata, the record itself is not read.
+    if request.if_none_match.contains(etag):
+        response = make_response("", 304)
+    else:
+        _, _, payload = encoded_geometry(version)
+        response = make_response(payload if accepts_gzip else gzip.decompress(payload))
+        response.headers["Content-Type"] = "application/octet-stream"
+        if accepts_gzip:
+            response.headers["Content-Encoding"] = "gzip"
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["Vary"] = "Accept-Encoding"
+    response.set_etag(etag)
+    return response
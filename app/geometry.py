@@ -0,0 +1,30 @@
+""" Geometry Module
+
+This module interprets logged L-System records into the geometry served to
+the web viewer, using the interpreter of the pylrender package.
+
+"""
+from pylrender.geometry import interpret
+
+def parse_translations(translations):
+    """
+    Parses translations as logged in the history file ("F : draw 20, + : angle 90").
+
+    :param translations: Logged translations string
+    :return: Dictionary mapping symbols to their translation
+    """
+    parsed = {}
+    for translation in translations.split(", "):
+        symbol, operation = translation.split(" : ", 1)
+        parsed[symbol] = operation
+    return parsed
+
+def build_geometry(string, translations):
+    """
+    Interprets a logged iterated L-System string into line segments.
+
+    :param string: Iterated L-System string
+    :param translations: Logged translations string
+    :return: Geometry object
+    """
+    return interpret(string, parse_translations(translations))
@@ -1,97 +1,78 @@
-class DrawingState {
-    constructor(x, y, angle, color) {
-        this.x = x;
-        this.y = y;
-        this.angle = angle
-        this.color = color
-    }
+// Number of segments drawn per animation frame
+const SEGMENTS_PER_FRAME = 20000;
+// Payload header: uint32 segment count followed by float32 bounding box
+const HEADER_BYTES = 20;
+const MARGIN = 20;
+const LINE_WIDTH = 2;
+
+// Fetch geometry payload and split it into typed array views
+async function fetchGeometry(url) {
+    let response = await fetch(url);
+    let buffer = await response.arrayBuffer();
+    let view = new DataView(buffer);
+    let count = view.getUint32(0, true);
+    let bounds = {
+        minX: view.getFloat32(4, true),
+        minY: view.getFloat32(8, true),
+        maxX: view.getFloat32(12, true),
+        maxY: view.getFloat32(16, true)
+    };
+    let coordinates = new Float32Array(buffer, HEADER_BYTES, count * 4);
+    let colors = new Uint16Array(buffer, HEADER_BYTES + count * 16, count);
+    return {count, bounds, coordinates, colors};
 }
 
-function generateSVGPaths(iteratedString, translations) {
-    translations = parseTranslations(translations)
-    let path = "M400,250";
-    let pos = {x:400, y:250};
-    let angle = 0;
-    let color = "black";
-    let stack = [];
-    let paths = [];
+// Scale and translate turtle coordinates (y up) to fit canvas (y down)
+function fitTransform(canvas, bounds) {
+    let width = Math.max(bounds.maxX - bounds.minX, 1);
+    let height = Math.max(bounds.maxY - bounds.minY, 1);
+    let scale = Math.min((canvas.width - 2 * MARGIN) / width, (canvas.height - 2 * MARGIN) / height, 1);
+    return {
+        scale,
+        x: (canvas.width - scale * (bounds.maxX + bounds.minX)) / 2,
+        y: (canvas.height + scale * (bounds.maxY + bounds.minY)) / 2
+    };
+}
 
-    for (let i = 0; i < iteratedString.length; i++) {
-        let symbol = iteratedString[i];
-        let operation = translations[symbol];
-        let parameter;
-        if (operation.includes(" ")) {
-            let index = operation.indexOf(" ")
-            parameter = operation.slice(index+1);
-            operation = operation.slice(0,index);
-        }
+// Draw segments in chunks, one chunk per animation frame
+function drawGeometry(canvas, geometry, palette) {
+    let context = canvas.getContext("2d");
+    let transform = fitTransform(canvas, geometry.bounds);
+    context.setTransform(transform.scale, 0, 0, -transform.scale, transform.x, transform.y);
+    context.lineWidth = LINE_WIDTH / transform.scale;
+    context.lineCap = "round";
 
-        if (operation == "forward") {
-            pos.x += parameter * Math.cos(angle);
-            pos.y += parameter * Math.sin(angle);
-            path += ` M${pos.x.toFixed(2)},${pos.y.toFixed(2)}`;
-        }
-        else if (operation == "draw") {
-            pos.x += parameter * Math.cos(angle);
-            pos.y += parameter * Math.sin(angle);
-            path += ` L${pos.x.toFixed(2)},${pos.y.toFixed(2)}`;
-        }
-        else if (operation == "angle") {
-            angle += -parameter * Math.PI / 180
-        }
-        else if (operation == "color") {
-            paths.push({path, color})
-            path = `M${pos.x.toFixed(2)},${pos.y.toFixed(2)}`;
-            if (parameter.includes(" ")) {
-                parameter = parameter.split(" ");
-                parameter = `rgb(${parameter[0]}, ${parameter[1]}, ${parameter[2]})`;
+    let {count, coordinates, colors} = geometry;
+    let start = 0;
+
+    function drawChunk() {
+        let end = Math.min(start + SEGMENTS_PER_FRAME, count);
+        let i = start;
+        // Batch consecutive segments of the same color into a single stroke
+        while (i < end) {
+            let color = colors[i];
+            context.beginPath();
+            while (i < end && colors[i] == color) {
+                context.moveTo(coordinates[4 * i], coordinates[4 * i + 1]);
+                context.lineTo(coordinates[4 * i + 2], coordinates[4 * i + 3]);
+                i++;
             }
-            color = parameter
-        }
-        else if (operation == "push") {
-            stack.push(new DrawingState(pos.x, pos.y, angle, color))          
+            context.strokeStyle = palette[color];
+            context.stroke();
         }
-        else if (operation == "pop") {
-            drawingState = stack.pop()
-            pos.x = drawingState.x
-            pos.y = drawingState.y
-            angle = drawingState.angle
-            color = drawingState.color
-            path += ` M${pos.x.toFixed(2)},${pos.y.toFixed(2)}`;
+        start = end;
+        if (start < count) {
+            requestAnimationFrame(drawChunk);
         }
-        else if (operation == "nop") {}
     }
-    paths.push({path, color})
-    return paths
+    requestAnimationFrame(drawChunk);
 }
 
-// Parse translations string into object
-function parseTranslations(translations) {
-    let translationsObject = {};
-    let translationsArray = translations.split(",")
-    for (let i = 0; i < translationsArray.length; i++) {
-        let translation = translationsArray[i].trim().split(":");
-        let symbol = translation[0].trim();
-        let operation = translation[1].trim();
-        translationsObject[symbol] = operation;
-      }
-    return translationsObject
-}
-
-function generateSVG() {
-    let paths = generateSVGPaths(iteratedString, translations)
-    
-    const svg = d3.select("svg")
-        .attr("width",2000)
-        .attr("height",2000);
-    
-    for (let i = 0; i < paths.length; i++) {
-        svg.append("path")
-            .attr("d",paths[i].path)
-            .attr("fill","none")
-            .attr("stroke",paths[i].color)
-            .attr("stroke-width",2)
-    }
+async function renderCanvas() {
+    let canvas = document.getElementById("lsystem");
+    let palette = JSON.parse(canvas.dataset.palette);
+    let geometry = await fetchGeometry(canvas.dataset.geometryUrl);
+    drawGeometry(canvas, geometry, palette);
 }
 
-generateSVG()
\ No newline at end of file
+renderCanvas()
@@ -0,0 +1,275 @@
+import math
+from array import array
+from fractions import Fraction
+
+from utils import *
+from geometry import Geometry, css_color, DEFAULT_COLOR
+
+# Upper bound on the number of distinct headings, i.e. 360 divided by the
+# greatest common divisor of all angles (0.1 degree resolution).
+MAX_HEADINGS = 3600
+
+class SymbolTransform:
+    def __init__(self, displacements, turn, boxes, color=None, balance=0):
+        """
+        Initializes a new SymbolTransform object describing the net effect of an expanded symbol on the turtle.
+
+        Displacements and boxes are indexed by the heading the turtle has when
+        the expansion starts and are relative to the starting position.
+
+        :param displacements: Net (dx, dy) displacement per starting heading (list)
+        :param turn: Net heading change in heading steps (int)
+        :param boxes: Bounding box (min_x, min_y, max_x, max_y) of the drawn segments per starting heading, None if nothing is drawn (list)
+        :param color: Pen color after the expansion, None if unchanged
+        :param balance: +1 for a lone push, -1 for a lone pop and 0 for balanced expansions (int)
+        """
+        self.displacements = displacements
+        self.turn = turn
+        self.boxes = boxes
+        self.color = color
+        self.balance = balance
+
+class LSystemAnalysis:
+    def __init__(self, lsystem):
+        """
+        Initializes a new LSystemAnalysis object for a deterministic, drawable L-System.
+
+        :param lsystem: L-System to analyse (LSystem)
+        """
+        if lsystem.translations == None:
+            raise AttributeError("L-System is not drawable. Define 'translations' in configuration file.")
+
+        if any(isinstance(rule, list) for rule in lsystem.rules.values()):
+            raise ValueError("Unable to analyse L-System with stochastic rules.")
+
+        self.lsystem = lsystem
+        self.operations = {}
+        for symbol, translation in lsystem.translations.items():
+            operation, _, parameter = translation.partition(" ")
+            self.operations[symbol] = (operation, parameter)
+
+        step = self.__heading_step()
+        # Count the headings on the exact step, a float quotient can truncate to one heading less.
+        self.headings = int(360 / step)
+        self.heading_step = float(step)
+        self.cosines = [math.cos(math.radians(h * self.heading_step)) for h in range(self.headings)]
+        self.sines = [math.sin(math.radians(h * self.heading_step)) for h in range(self.headings)]
+        self.transforms = {}
+
+    def transform(self, symbol, depth):
+        """
+        Returns the net transform of a symbol expanded a given amount of times.
+
+        :param symbol: L-System symbol (str)
+        :param depth: Number of times to apply the reproduction rules (int)
+        :return: SymbolTransform object
+        """
+        if symbol not in self.lsystem.rules or depth == 0:
+            if (symbol, 0) not in self.transforms:
+                self.transforms[(symbol, 0)] = self.__base_transform(symbol)
+            return self.transforms[(symbol, 0)]
+
+        if (symbol, depth) not in self.transforms:
+            reachable = [symbol]
+            for current in reachable:
+                for child in self.lsystem.rules[current]:
+                    if child in self.lsystem.rules and child not in reachable:
+                        reachable.append(child)
+
+            # Build level by level so every composition only needs transforms of the previous level.
+            for level in range(1, depth + 1):
+                for current in reachable:
+                    if (current, level) not in self.transforms:
+                        self.transforms[(current, level)] = self.__compose(self.lsystem.rules[current], level - 1)
+        return self.transforms[(symbol, depth)]
+
+    def bounds(self, iterations):
+        """
+        Computes the bounding box of the iterated L-System without expanding it.
+
+        :param iterations: Number of iterations (int)
+        :return: (min_x, min_y, max_x, max_y) tuple or None if nothing is drawn
+        """
+        if not is_pos_int(iterations):
+            raise ValueError("Unvalid number of iterations.")
+        return self.__compose(self.lsystem.axiom, int(iterations)).boxes[0]
+
+    def endpoint(self, iterations):
+        """
+        Computes the final turtle position and heading of the iterated L-System without expanding it.
+
+        :param iterations: Number of iterations (int)
+        :return: (x, y, heading) tuple, heading in degrees
+        """
+        if not is_pos_int(iterations):
+            raise ValueError("Unvalid number of iterations.")
+        transform = self.__compose(self.lsystem.axiom, int(iterations))
+        return (*transform.displacements[0], transform.turn * self.heading_step)
+
+    def geometry(self, iterations, viewport=None):
+        """
+        Builds the segments of the iterated L-System by walking its derivation tree,
+        skipping every subtree whose bounding box falls outside the viewport.
+
+        :param iterations: Number of iterations (int)
+        :param viewport: (min_x, min_y, max_x, max_y) tuple or None to build all segments
+        :return: Geometry object
+        """
+        if not is_pos_int(iterations):
+            raise ValueError("Unvalid number of iterations.")
+
+        palette = [DEFAULT_COLOR]
+        palette_indices = {DEFAULT_COLOR: 0}
+        coordinates = array("f")
+        colors = array("H")
+        # Turtle state: x, y, heading index, palette index
+        state = [0.0, 0.0, 0, 0]
+        stack = []
+
+        def palette_index(color):
+            color = css_color(color)
+            if color not in palette_indices:
+                palette_indices[color] = len(palette)
+                palette.append(color)
+            return palette_indices[color]
+
+        def visit(symbol, depth):
+            x, y, h, _ = state
+            transform = self.transform(symbol, depth)
+            if transform.balance == 1:
+                stack.append(list(state))
+                return
+            if transform.balance == -1:
+                state[:] = stack.pop()
+                return
+
+            box = transform.boxes[h]
+            if depth > 0 and symbol in self.lsystem.rules and (box == None or not intersects(box, x, y, viewport)):
+                # Nothing of this subtree is drawn inside the viewport, only apply its net effect.
+                dx, dy = transform.displacements[h]
+                state[0], state[1] = x + dx, y + dy
+                state[2] = (h + transform.turn) % self.headings
+                if transform.color != None:
+                    state[3] = palette_index(transform.color)
+                return
+
+            if depth == 0 or symbol not in self.lsystem.rules:
+                operation, parameter = self.operations[symbol]
+                dx, dy = transform.displacements[h]
+                if operation == "draw":
+                    coordinates.extend((x, y, x + dx, y + dy))
+                    colors.append(state[3])
+                elif operation == "color":
+                    state[3] = palette_index(parameter)
+                state[0], state[1] = x + dx, y + dy
+                state[2] = (h + transform.turn) % self.headings
+                return
+
+            for child in self.lsystem.rules[symbol]:
+                visit(child, depth - 1)
+
+        for symbol in self.lsystem.axiom:
+            visit(symbol, int(iterations))
+
+        if len(colors):
+            xs, ys = coordinates[0::2], coordinates[1::2]
+            bounds = (min(xs), min(ys), max(xs), max(ys))
+        else:
+            bounds = (0.0, 0.0, 0.0, 0.0)
+        return Geometry(coordinates, colors, palette, bounds, self.lsystem.width)
+
+    def __heading_step(self):
+        """
+        Returns the largest angle (degrees, Fraction) every reachable heading is a multiple of.
+        """
+        step = Fraction(360)
+        for operation, parameter in self.operations.values():
+            if operation == "angle":
+                angle = abs(Fraction(parameter).limit_denominator(1000))
+                if angle != 0:
+                    step = Fraction(math.gcd(step.numerator * angle.denominator, angle.numerator * step.denominator),
+                                    step.denominator * angle.denominator)
+        if 360 / step > MAX_HEADINGS:
+            raise ValueError(f"Unable to analyse L-System with more than {MAX_HEADINGS} distinct headings.")
+        return step
+
+    def __base_transform(self, symbol):
+        """
+        Returns the transform of a single symbol's translation.
+        """
+        operation, parameter = self.operations[symbol]
+        zero = [(0.0, 0.0)] * self.headings
+        if operation == "draw" or operation == "forward":
+            length = float(parameter)
+            displacements = [(length * self.cosines[h], length * self.sines[h]) for h in range(self.headings)]
+            boxes = [None] * self.headings
+            if operation == "draw":
+                boxes = [(min(0.0, dx), min(0.0, dy), max(0.0, dx), max(0.0, dy)) for dx, dy in displacements]
+            return SymbolTransform(displacements, 0, boxes)
+        if operation == "angle":
+            turn = round(float(parameter) / self.heading_step)
+            return SymbolTransform(zero, turn, [None] * self.headings)
+        if operation == "color":
+            return SymbolTransform(zero, 0, [None] * self.headings, color=parameter)
+        if operation == "push":
+            return SymbolTransform(zero, 0, [None] * self.headings, balance=1)
+        if operation == "pop":
+            return SymbolTransform(zero, 0, [None] * self.headings, balance=-1)
+        return SymbolTransform(zero, 0, [None] * self.headings)
+
+    def __compose(self, string, depth):
+        """
+        Composes the transforms of every symbol of a string expanded a given amount of times.
+        """
+        children = [self.transform(symbol, depth) for symbol in string]
+        displacements, boxes = [], []
+        turn, color = 0, None
+
+        for start in range(self.headings):
+            x, y, h = 0.0, 0.0, start
+            box = None
+            color = None
+            stack = []
+            for child in children:
+                if child.balance == 1:
+                    stack.append((x, y, h, color))
+                    continue
+                if child.balance == -1:
+                    if not stack:
+                        raise ValueError(f"Unable to analyse unbalanced push/pop in '{string}'.")
+                    x, y, h, color = stack.pop()
+                    continue
+                child_box = child.boxes[h]
+                if child_box != None:
+                    child_box = (x + child_box[0], y + child_box[1], x + child_box[2], y + child_box[3])
+                    box = child_box if box == None else (
+                        min(box[0], child_box[0]), min(box[1], child_box[1]),
+                        max(box[2], child_box[2]), max(box[3], child_box[3])
+                    )
+                dx, dy = child.displacements[h]
+                x, y = x + dx, y + dy
+                h = (h + child.turn) % self.headings
+                if child.color != None:
+                    color = child.color
+            if stack:
+                raise ValueError(f"Unable to analyse unbalanced push/pop in '{string}'.")
+            displacements.append((x, y))
+            boxes.append(box)
+            turn = (h - start) % self.headings
+
+        return SymbolTransform(displacements, turn, boxes, color)
+
+def intersects(box, x, y, viewport):
+    """
+    Checks whether a box translated by (x, y) overlaps the viewport.
+
+    :param box: (min_x, min_y, max_x, max_y) tuple
+    :param x: Translation along the x-axis (float)
+    :param y: Translation along the y-axis (float)
+    :param viewport: (min_x, min_y, max_x, max_y) tuple or None for an unbounded viewport
+    :return: bool
+    """
+    if viewport == None:
+        return True
+    return (x + box[0] <= viewport[2] and x + box[2] >= viewport[0] and
+            y + box[1] <= viewport[3] and y + box[3] >= viewport[1])
@@ -0,0 +1,255 @@
+#! /usr/bin/env python3
+
+import os
+import sys
+import json
+import gzip
+import hashlib
+import datetime
+
+HISTORY_PATH = os.path.join(os.path.dirname(__file__), '../app/history.txt')
+BACKUP_DIR = os.path.expanduser('~/.l-systems/')
+MANIFEST_FILENAME = "manifest.json"
+OBJECTS_DIRNAME = "objects"
+# Number of most recent restore points kept.
+DEFAULT_RETENTION = 168
+# Number of bytes at both ends of the backed up history used to detect a replaced history file.
+FINGERPRINT_BYTES = 4096
+
+class HistoryBackup:
+    def __init__(self, backup_dir=BACKUP_DIR, history_path=HISTORY_PATH, retention=DEFAULT_RETENTION):
+        """
+        Initializes a new HistoryBackup object.
+
+        Every backup stores only the history records appended since the previous
+        backup in a compressed segment file. The resulting strings of the records
+        are stored once per distinct content in a hash addressed object store.
+
+        :param backup_dir: Directory to store segments, objects and manifest in
+        :param history_path: Path of the history file to back up
+        :param retention: Number of most recent restore points to keep (int)
+        """
+        if not isinstance(retention, int) or retention < 1:
+            raise ValueError("Unvalid retention. Expected positive integer value.")
+
+        self.backup_dir = backup_dir
+        self.history_path = history_path
+        self.retention = retention
+        self.objects_dir = os.path.join(backup_dir, OBJECTS_DIRNAME)
+        self.manifest_path = os.path.join(backup_dir, MANIFEST_FILENAME)
+
+    def segments(self):
+        """
+        Lists the retained restore points, oldest first.
+
+        :return: List of segment descriptions (dict)
+        """
+        return self.__load_manifest()["segments"][-self.retention:]
+
+    def backup(self):
+        """
+        Backs up the history records appended since the last backup.
+
+        :return: Description of the written segment (dict) or None if there was nothing to back up
+        """
+        os.makedirs(self.objects_dir, exist_ok=True)
+        manifest = self.__load_manifest()
+
+        with open(self.history_path, 'rb') as f:
+            # Start over from the beginning if the history was truncated or replaced since the last backup.
+            base = manifest["fingerprint"] != self.__fingerprint(f, manifest["offset"])
+            offset = 0 if base else manifest["offset"]
+            f.seek(offset)
+            data = f.read()
+
+        # Only back up complete records, a record might still be being written.
+        data = data[:data.rfind(b"\n") + 1]
+        if not data:
+            return None
+
+        records = []
+        for line in data.decode('utf-8').split("\n")[:-1]:
+            prefix, separator, string = line.rpartition("\t")
+            records.append([prefix if separator else None, self.__store_object(string)])
+
+        name = f"segment-{manifest['sequence'] + 1:06d}.gz"
+        segment = {
+            "name" : name,
+            "filename" : name,
+            "created" : str(datetime.datetime.now()),
+            "records" : len(records),
+            "base" : base or not manifest["segments"]
+        }
+        self.__write_segment(segment["filename"], records)
+
+        manifest["sequence"] += 1
+        manifest["offset"] = offset + len(data)
+        with open(self.history_path, 'rb') as f:
+            manifest["fingerprint"] = self.__fingerprint(f, manifest["offset"])
+        for _, digest in records:
+            manifest["references"][digest] = manifest["references"].get(digest, 0) + 1
+        manifest["segments"].append(segment)
+        self.__save_manifest(manifest)
+        self.__enforce_retention(manifest)
+        return segment
+
+    def restore(self, name=None):
+        """
+        Restores the history file by replaying segments up to the given restore point.
+
+        :param name: Name of the segment to restore up to, defaults to the most recent segment
+        :return: Number of restored records (int)
+        """
+        manifest = self.__load_manifest()
+        segments = manifest["segments"]
+        names = [segment["name"] for segment in segments]
+        if name == None and segments:
+            name = names[-1]
+        if name not in [segment["name"] for segment in self.segments()]:
+            raise FileNotFoundError("Backup segment not found.")
+
+        end = names.index(name) + 1
+        start = max(i for i in range(end) if segments[i]["base"])
+
+        restored = 0
+        temp_path = self.history_path + ".restore"
+        with open(temp_path, 'w', encoding='utf-8', newline='') as f:
+            for segment in segments[start:end]:
+                for prefix, digest in self.__read_segment(segment["filename"]):
+                    string = self.__load_object(digest)
+                    f.write(f"{prefix}\t{string}\n" if prefix != None else f"{string}\n")
+                    restored += 1
+        os.replace(temp_path, self.history_path)
+
+        # Restoring the most recent segment continues its chain, restoring an older one
+        # diverges from the backed up history so the next backup starts a new base.
+        if end == len(segments):
+            with open(self.history_path, 'rb') as f:
+                manifest["offset"] = os.path.getsize(self.history_path)
+                manifest["fingerprint"] = self.__fingerprint(f, manifest["offset"])
+        else:
+            manifest["offset"], manifest["fingerprint"] = 0, None
+        self.__save_manifest(manifest)
+        return restored
+
+    def __enforce_retention(self, manifest):
+        """
+        Compacts the chain once it holds twice the retained restore points and removes
+        the segments and objects no retained restore point depends on any more.
+
+        The oldest retained segment is replaced by a base segment holding the
+        records of every segment it depends on. Compacting only every 'retention'
+        backups keeps the cost of rewriting the base from growing with every backup,
+        and the reference counts in the manifest find unused objects without reading
+        the retained segments again.
+        """
+        segments = manifest["segments"]
+        if len(segments) < 2 * self.retention:
+            return
+
+        first = len(segments) - self.retention
+        start = max(i for i in range(first + 1) if segments[i]["base"])
+        dropped = segments[:first + 1] if start < first else segments[:first]
+        contents = {segment["filename"] : self.__read_segment(segment["filename"]) for segment in dropped}
+
+        references = manifest["references"]
+        retained = segments[first:]
+        if start < first:
+            records = [record for segment in segments[start:first + 1] for record in contents[segment["filename"]]]
+            # Write the base under a new name, the manifest keeps referring to the old chain until it is saved.
+            base = dict(segments[first], filename=f"base-{manifest['sequence']:06d}.gz", records=len(records), base=True)
+            self.__write_segment(base["filename"], records)
+            for _, digest in records:
+                references[digest] += 1
+            retained[0] = base
+
+        for records in contents.values():
+            for _, digest in records:
+                references[digest] -= 1
+        unused = [digest for digest, count in references.items() if count == 0]
+        for digest in unused:
+            del references[digest]
+        manifest["segments"] = retained
+        self.__save_manifest(manifest)
+
+        # Remove files only once the saved manifest no longer refers to them, an interrupted cleanup leaves unused files at worst.
+        for segment in dropped:
+            os.remove(os.path.join(self.backup_dir, segment["filename"]))
+        for digest in unused:
+            os.remove(os.path.join(self.objects_dir, digest + ".gz"))
+
+    def __fingerprint(self, f, offset):
+        """
+        Hashes the first and last bytes of the first offset bytes of an opened history file.
+        """
+        f.seek(0, os.SEEK_END)
+        if f.tell() < offset:
+            return None
+        digest = hashlib.sha256()
+        f.seek(0)
+        digest.update(f.read(min(offset, FINGERPRINT_BYTES)))
+        f.seek(max(0, offset - FINGERPRINT_BYTES))
+        digest.update(f.read(min(offset, FINGERPRINT_BYTES)))
+        return digest.hexdigest()
+
+    def __store_object(self, string):
+        """
+        Stores a resulting string in the object store unless identical content is already present.
+        """
+        data = string.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        path = os.path.join(self.objects_dir, digest + ".gz")
+        if not os.path.exists(path):
+            with open(path + ".tmp", 'wb') as f:
+                f.write(gzip.compress(data))
+            os.replace(path + ".tmp", path)
+        return digest
+
+    def __load_object(self, digest):
+        with open(os.path.join(self.objects_dir, digest + ".gz"), 'rb') as f:
+            return gzip.decompress(f.read()).decode('utf-8')
+
+    def __write_segment(self, name, records):
+        path = os.path.join(self.backup_dir, name)
+        with gzip.open(path + ".tmp", 'wt', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+        os.replace(path + ".tmp", path)
+
+    def __read_segment(self, name):
+        with gzip.open(os.path.join(self.backup_dir, name), 'rt', encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def __load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {"sequence" : 0, "offset" : 0, "fingerprint" : None, "segments" : [], "references" : {}}
+        with open(self.manifest_path, 'r') as f:
+            return json.load(f)
+
+    def __save_manifest(self, manifest):
+        with open(self.manifest_path + ".tmp", 'w') as f:
+            # The reference counts grow with the object store, json.dumps without indentation encodes them in C.
+            f.write(json.dumps(manifest))
+        os.replace(self.manifest_path + ".tmp", self.manifest_path)
+
+if __name__ == "__main__":
+    history_backup = HistoryBackup()
+    if len(sys.argv) == 1:
+        segment = history_backup.backup()
+        print(f"Backed up {segment['records']} record(s) to {segment['name']}." if segment else "Nothing to back up.")
+    elif len(sys.argv) == 2 and sys.argv[1] == '--restore':
+        segments = history_backup.segments()
+        if not segments:
+            print(f"No backups found in {history_backup.backup_dir}.")
+            sys.exit(1)
+        print("Available backups:")
+        for segment in segments:
+            print(f"{segment['name']}\t{segment['created']}")
+        name = input("Which backup do you want to restore? (Enter the segment name): ")
+        try:
+            print(f"Restored {history_backup.restore(name)} record(s).")
+        except FileNotFoundError as e:
+            print(e)
+            sys.exit(1)
+    else:
+        print('Usage: python3 backup.py [--restore]')
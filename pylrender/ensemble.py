@@ -0,0 +1,143 @@
+import io
+import os
+import random
+import secrets
+import hashlib
+import statistics
+from concurrent.futures import ProcessPoolExecutor
+
+from utils import *
+from geometry import build_geometry, render_image
+
+SEED_BITS = 128
+
+def spawn_seeds(seed, variants):
+    """
+    Derives independent, reproducible per-variant seeds from a single root seed.
+
+    Every child seed is a hash of the root seed and the variant index, so a
+    variant can be regenerated on its own and does not depend on how variants
+    were distributed over worker processes.
+
+    :param seed: Root seed (int) or None to draw fresh entropy
+    :param variants: Number of seeds to spawn (int)
+    :return: (root seed, list of child seeds) tuple
+    """
+    if seed == None:
+        seed = secrets.randbits(SEED_BITS)
+    children = []
+    for index in range(variants):
+        digest = hashlib.sha256(f"{seed}:{index}".encode("utf-8")).digest()
+        children.append(int.from_bytes(digest[:SEED_BITS // 8], "big"))
+    return seed, children
+
+def generate_variant(lsystem, iterations, seed):
+    """
+    Expands a single variant with its own random number generator.
+
+    :param lsystem: L-System to expand (LSystem)
+    :param iterations: Number of iterations to perform (int)
+    :param seed: Variant seed (int)
+    :return: Iterated L-System string
+    """
+    return lsystem.expand(iterations, random.Random(seed))
+
+class EnsembleVariant:
+    def __init__(self, index, seed, length, thumbnail=None):
+        """
+        Initializes a new EnsembleVariant object.
+
+        :param index: Position of the variant in the ensemble (int)
+        :param seed: Seed reproducing the variant through generate_variant (int)
+        :param length: Length of the iterated L-System string (int)
+        :param thumbnail: PNG encoded thumbnail (bytes) or None
+        """
+        self.index = index
+        self.seed = seed
+        self.length = length
+        self.thumbnail = thumbnail
+
+class Ensemble:
+    def __init__(self, seed, iterations, variants):
+        """
+        Initializes a new Ensemble object.
+
+        :param seed: Root seed the variant seeds were spawned from (int)
+        :param iterations: Number of iterations every variant was expanded with (int)
+        :param variants: Generated variants (list of EnsembleVariant)
+        """
+        self.seed = seed
+        self.iterations = iterations
+        self.variants = variants
+
+    def statistics(self):
+        """
+        Summarizes the output lengths of all variants.
+
+        :return: Dictionary with min, max, mean, median and stdev of the output lengths
+        """
+        lengths = [variant.length for variant in self.variants]
+        return {
+            "min" : min(lengths),
+            "max" : max(lengths),
+            "mean" : statistics.mean(lengths),
+            "median" : statistics.median(lengths),
+            "stdev" : statistics.pstdev(lengths)
+        }
+
+# State shared by all tasks of a worker process, set once by the pool initializer.
+_worker_state = {}
+
+def _init_worker(lsystem, iterations, thumbnail_size):
+    _worker_state["lsystem"] = lsystem
+    _worker_state["iterations"] = iterations
+    _worker_state["thumbnail_size"] = thumbnail_size
+
+def _expand_variant(task):
+    index, seed = task
+    lsystem = _worker_state["lsystem"]
+    string = generate_variant(lsystem, _worker_state["iterations"], seed)
+
+    thumbnail = None
+    if _worker_state["thumbnail_size"]:
+        image = render_image(build_geometry(lsystem, string), _worker_state["thumbnail_size"])
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+        thumbnail = buffer.getvalue()
+    return EnsembleVariant(index, seed, len(string), thumbnail)
+
+def generate_ensemble(lsystem, iterations, variants, seed=None, workers=None, thumbnail_size=None):
+    """
+    Expands a number of stochastic variants of an L-System across a process pool.
+
+    :param lsystem: L-System to expand (LSystem)
+    :param iterations: Number of iterations to perform per variant (int)
+    :param variants: Number of variants to generate (int)
+    :param seed: Root seed for reproducible ensembles (int) or None
+    :param workers: Number of worker processes, defaults to the number of CPUs
+    :param thumbnail_size: Thumbnail width and height in pixels, or None to skip thumbnails
+    :return: Ensemble object
+    """
+    if not is_pos_int(iterations):
+        raise ValueError("Unvalid number of iterations.")
+
+    if not is_pos_int(variants):
+        raise ValueError("Unvalid number of variants.")
+
+    if thumbnail_size and lsystem.translations == None:
+        raise AttributeError("L-System is not drawable. Define 'translations' in configuration file.")
+
+    seed, seeds = spawn_seeds(seed, int(variants))
+    tasks = list(enumerate(seeds))
+    workers = workers or os.cpu_count() or 1
+    # Hand out several variants per round trip to amortize inter-process overhead.
+    chunksize = max(1, len(tasks) // (4 * workers))
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(lsystem, int(iterations), thumbnail_size)
+    ) as executor:
+        results = list(executor.map(_expand_variant, tasks, chunksize=chunksize))
+
+    return Ensemble(seed, int(iterations), results)
@@ -0,0 +1,228 @@
+import os
+import sys
+import json
+import time
+import struct
+import hashlib
+import zipfile
+import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+from utils import *
+from geometry import build_geometry, render_image
+from analysis import LSystemAnalysis
+
+MANIFEST_FILENAME = "manifest.json"
+SVG_MARGIN = 10
+
+class ExportTarget:
+    def __init__(self, format, filename, size=None):
+        """
+        Initializes a new ExportTarget object describing one artifact of an export.
+
+        :param format: Artifact format, one of the keys of WRITERS (str)
+        :param filename: Name of the artifact inside the export directory
+        :param size: Width and height in pixels, required for raster formats (int)
+        """
+        if format not in WRITERS:
+            raise ValueError(f"Unsupported export format '{format}'.")
+
+        if format == "png" and not is_pos_int(size):
+            raise ValueError("Unvalid PNG size. Expected positive integer value.")
+
+        self.format = format
+        self.filename = filename
+        self.size = size
+
+def write_png(geometry, path, size):
+    """
+    Rasterizes geometry to a PNG image.
+
+    :param geometry: Geometry object
+    :param path: Path of the PNG file
+    :param size: Width and height in pixels (int)
+    """
+    render_image(geometry, size).save(path, format="PNG")
+
+def write_svg(geometry, path, size=None):
+    """
+    Writes geometry as an SVG document with one path per run of equally colored segments.
+
+    :param geometry: Geometry object
+    :param path: Path of the SVG file
+    :param size: Unused, SVG output is scalable
+    """
+    min_x, min_y, max_x, max_y = geometry.bounds
+    width = max_x - min_x + 2 * SVG_MARGIN
+    height = max_y - min_y + 2 * SVG_MARGIN
+    with open(path, 'w') as f:
+        f.write(
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{width:.2f}" height="{height:.2f}" '
+            f'viewBox="{min_x - SVG_MARGIN:.2f} {-max_y - SVG_MARGIN:.2f} {width:.2f} {height:.2f}">\n'
+            f'<g fill="none" stroke-width="{geometry.width or 1}" stroke-linecap="round">\n'
+        )
+        color, commands, end = None, [], None
+        for x0, y0, x1, y1, segment_color in geometry.segments():
+            if segment_color != color:
+                if commands:
+                    f.write(f'<path stroke="{color}" d="{"".join(commands)}"/>\n')
+                color, commands, end = segment_color, [], None
+            # The SVG y-axis points down, the turtle y-axis points up.
+            if (x0, y0) != end:
+                commands.append(f"M{x0:.2f} {-y0:.2f}")
+            commands.append(f"L{x1:.2f} {-y1:.2f}")
+            end = (x1, y1)
+        if commands:
+            f.write(f'<path stroke="{color}" d="{"".join(commands)}"/>\n')
+        f.write('</g>\n</svg>\n')
+
+def write_npz(geometry, path, size=None):
+    """
+    Writes the raw segment buffers as a NumPy .npz archive without requiring NumPy.
+
+    The archive holds 'segments' (N x 4 float32), 'colors' (N uint16 palette
+    indices), 'palette' (unicode strings) and 'bounds' (4 float32).
+
+    :param geometry: Geometry object
+    :param path: Path of the .npz file
+    :param size: Unused
+    """
+    palette_length = max(len(color) for color in geometry.palette)
+    palette = b"".join(color.ljust(palette_length, "\0").encode("utf-32-le") for color in geometry.palette)
+    arrays = {
+        "segments" : ("<f4", (len(geometry), 4), geometry.coordinates),
+        "colors" : ("<u2", (len(geometry),), geometry.colors),
+        "palette" : (f"<U{palette_length}", (len(geometry.palette),), palette),
+        "bounds" : ("<f4", (4,), struct.pack("<4f", *geometry.bounds))
+    }
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, (descr, shape, data) in arrays.items():
+            archive.writestr(name + ".npy", npy_bytes(descr, shape, data))
+
+def npy_bytes(descr, shape, data):
+    """
+    Serializes a little-endian buffer in the NumPy .npy format (version 1.0).
+
+    :param descr: NumPy dtype descriptor, e.g. '<f4'
+    :param shape: Array shape (tuple)
+    :param data: Array contents (bytes or array.array)
+    :return: .npy file contents (bytes)
+    """
+    if not isinstance(data, bytes):
+        if sys.byteorder != "little":
+            data = type(data)(data.typecode, data)
+            data.byteswap()
+        data = data.tobytes()
+    header = repr({"descr" : descr, "fortran_order" : False, "shape" : shape})
+    # Pad the header with spaces so the data starts at a multiple of 64 bytes.
+    padding = 64 - (10 + len(header) + 1) % 64
+    header = (header + " " * padding + "\n").encode("latin1")
+    return b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header + data
+
+WRITERS = {
+    "png" : write_png,
+    "svg" : write_svg,
+    "npz" : write_npz
+}
+
+DEFAULT_TARGETS = [
+    ExportTarget("png", "lsystem-1024.png", 1024),
+    ExportTarget("png", "lsystem-thumbnail.png", 128),
+    ExportTarget("svg", "lsystem.svg"),
+    ExportTarget("npz", "lsystem.npz")
+]
+
+def write_target(geometry, directory, target):
+    """
+    Writes geometry to a single target and describes the written artifact.
+
+    :param geometry: Geometry object
+    :param directory: Directory to write the artifact to
+    :param target: Artifact to write (ExportTarget)
+    :return: Artifact description (dict)
+    """
+    path = os.path.join(directory, target.filename)
+    start = time.perf_counter()
+    WRITERS[target.format](geometry, path, target.size)
+    with open(path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    return {
+        "filename" : target.filename,
+        "format" : target.format,
+        "size" : target.size,
+        "bytes" : os.path.getsize(path),
+        "sha256" : digest,
+        "seconds" : time.perf_counter() - start
+    }
+
+# State shared by all tasks of a worker process, set once by the pool initializer.
+_worker_state = {}
+
+def _init_worker(geometry, directory):
+    _worker_state["geometry"] = geometry
+    _worker_state["directory"] = directory
+
+def _write_target(target):
+    return write_target(_worker_state["geometry"], _worker_state["directory"], target)
+
+def export_geometry(geometry, directory, targets=DEFAULT_TARGETS, workers=None, metadata=None):
+    """
+    Writes precomputed geometry to every target in parallel and records the artifacts in a manifest.
+
+    The writers are pure Python and hold the GIL, so targets are fanned out
+    over processes, at most one per CPU. The geometry is sent once to every
+    worker instead of once per target. With a single worker the targets are
+    written in this process to avoid the pickling and start-up overhead.
+
+    :param geometry: Geometry object shared by all writers
+    :param directory: Directory to write the artifacts and manifest to
+    :param targets: Artifacts to write (list of ExportTarget)
+    :param workers: Number of writer processes, defaults to one per target up to the number of CPUs
+    :param metadata: Additional description of the exported L-System (dict)
+    :return: Manifest (dict)
+    """
+    os.makedirs(directory, exist_ok=True)
+    workers = max(1, min(workers or len(targets), len(targets), os.cpu_count() or 1))
+
+    start = time.perf_counter()
+    if workers == 1:
+        artifacts = [write_target(geometry, directory, target) for target in targets]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(geometry, directory)) as executor:
+            artifacts = list(executor.map(_write_target, targets))
+
+    manifest = {
+        "created" : str(datetime.datetime.now()),
+        "segments" : len(geometry),
+        "bounds" : list(geometry.bounds),
+        "palette" : geometry.palette,
+        "seconds" : time.perf_counter() - start,
+        "artifacts" : artifacts
+    }
+    manifest.update(metadata or {})
+    with open(os.path.join(directory, MANIFEST_FILENAME), 'w') as f:
+        json.dump(manifest, f, indent=4)
+    return manifest
+
+def export(lsystem, iterations, directory, targets=DEFAULT_TARGETS, workers=None):
+    """
+    Expands and interprets an L-System once and fans the geometry out to every target.
+
+    Deterministic L-Systems are fitted using the bounds computed by LSystemAnalysis.
+
+    :param lsystem: Drawable L-System (LSystem)
+    :param iterations: Number of iterations (int)
+    :param directory: Directory to write the artifacts and manifest to
+    :param targets: Artifacts to write (list of ExportTarget)
+    :param workers: Number of writer processes, defaults to one per target up to the number of CPUs
+    :return: Manifest (dict)
+    """
+    string = lsystem.process(iterations)
+    try:
+        # Fit deterministic L-Systems from their symbol transforms instead of measuring every segment.
+        bounds = LSystemAnalysis(lsystem).bounds(iterations)
+    except ValueError:
+        # Stochastic rules, unbalanced push/pop or too many headings, let the interpreter measure the drawing.
+        bounds = None
+    geometry = build_geometry(lsystem, string, bounds)
+    return export_geometry(geometry, directory, targets, workers, metadata={"iterations" : int(iterations)})
@@ -0,0 +1,187 @@
+import sys
+import math
+import struct
+from array import array
+
+DEFAULT_COLOR = "black"
+
+# Binary payload layout (little-endian):
+#   uint32    number of segments N
+#   float32   bounding box min x, min y, max x, max y
+#   float32   N * (x0, y0, x1, y1) segment coordinates
+#   uint16    N palette indices, one per segment
+HEADER_FORMAT = "<I4f"
+
+class Geometry:
+    def __init__(self, coordinates, colors, palette, bounds, width):
+        """
+        Initializes a new Geometry object.
+
+        :param coordinates: Segment coordinates as flat (x0, y0, x1, y1) quadruples (array of float32)
+        :param colors: Palette index of every segment (array of uint16)
+        :param palette: Color strings referenced by the color indices (list)
+        :param bounds: Bounding box of all segments as (min_x, min_y, max_x, max_y)
+        :param width: Line width of the L-System
+        """
+        self.coordinates = coordinates
+        self.colors = colors
+        self.palette = palette
+        self.bounds = bounds
+        self.width = width
+
+    def __len__(self):
+        return len(self.colors)
+
+    def to_bytes(self):
+        """
+        Packs the geometry into the binary payload layout described by HEADER_FORMAT.
+
+        :return: Binary payload (bytes)
+        """
+        coordinates, colors = self.coordinates, self.colors
+        if sys.byteorder != "little":
+            coordinates, colors = array("f", coordinates), array("H", colors)
+            coordinates.byteswap()
+            colors.byteswap()
+        header = struct.pack(HEADER_FORMAT, len(self), *self.bounds)
+        return header + coordinates.tobytes() + colors.tobytes()
+
+    def segments(self):
+        """
+        Iterates over all segments.
+
+        :return: Generator of (x0, y0, x1, y1, color) tuples
+        """
+        coordinates, palette = self.coordinates, self.palette
+        for i, color in enumerate(self.colors):
+            yield (*coordinates[4*i:4*i+4], palette[color])
+
+def css_color(color):
+    """
+    Converts an L-System color parameter to a CSS color string.
+
+    :param color: Color name, hexadecimal value or space separated RGB-values
+    :return: CSS color string
+    """
+    if " " in color:
+        return "rgb({}, {}, {})".format(*color.split(" "))
+    return color
+
+def build_geometry(lsystem, string, bounds=None):
+    """
+    Interprets an iterated L-System string into line segments without a turtle screen.
+
+    Coordinates follow the turtle convention: the turtle starts at the origin
+    heading along the positive x-axis and positive angles turn to the left.
+
+    :param lsystem: Drawable L-System (LSystem)
+    :param string: Interpretable L-System instructions string
+    :param bounds: Known (min_x, min_y, max_x, max_y) of the drawing, measured while interpreting if None
+    :return: Geometry object
+    """
+    if lsystem.translations == None:
+        raise AttributeError("L-System is not drawable. Define 'translations' in configuration file.")
+
+    if not set(string).issubset(lsystem.alphabet):
+        raise ValueError(f"Non-interpretable L-System instructions string '{string}'.")
+
+    return interpret(string, lsystem.translations, lsystem.width, bounds)
+
+def interpret(string, translations, width=None, bounds=None):
+    """
+    Interprets a string of symbols into line segments using the given translations.
+
+    :param string: Interpretable L-System instructions string
+    :param translations: Dictionary mapping every symbol of string to its translation
+    :param width: Line width of the L-System
+    :param bounds: Known (min_x, min_y, max_x, max_y) of the drawing, measured while interpreting if None
+    :return: Geometry object
+    """
+    palette = [DEFAULT_COLOR]
+    palette_indices = {DEFAULT_COLOR: 0}
+
+    # Resolve every symbol once instead of re-parsing its translation per occurrence.
+    steps = {}
+    for symbol, translation in translations.items():
+        operation, _, parameter = translation.partition(" ")
+        if operation in ("draw", "forward", "angle"):
+            parameter = float(parameter)
+        elif operation == "color":
+            color = css_color(parameter)
+            if color not in palette_indices:
+                palette_indices[color] = len(palette)
+                palette.append(color)
+            parameter = palette_indices[color]
+        steps[symbol] = (operation, parameter)
+
+    coordinates = array("f")
+    colors = array("H")
+    x, y, heading, color = 0.0, 0.0, 0.0, 0
+    min_x = min_y = math.inf
+    max_x = max_y = -math.inf
+    measure = bounds == None
+    stack = []
+
+    for symbol in string:
+        operation, parameter = steps[symbol]
+        if operation == "draw" or operation == "forward":
+            radians = math.radians(heading)
+            next_x = x + parameter * math.cos(radians)
+            next_y = y + parameter * math.sin(radians)
+            if operation == "draw":
+                coordinates.extend((x, y, next_x, next_y))
+                colors.append(color)
+                if measure:
+                    min_x, max_x = min(min_x, x, next_x), max(max_x, x, next_x)
+                    min_y, max_y = min(min_y, y, next_y), max(max_y, y, next_y)
+            x, y = next_x, next_y
+        elif operation == "angle":
+            heading += parameter
+        elif operation == "color":
+            color = parameter
+        elif operation == "push":
+            stack.append((x, y, heading, color))
+        elif operation == "pop":
+            x, y, heading, color = stack.pop()
+
+    if measure:
+        bounds = (min_x, min_y, max_x, max_y) if colors else (0.0, 0.0, 0.0, 0.0)
+    return Geometry(coordinates, colors, palette, tuple(bounds), width)
+
+def render_image(geometry, size, margin=2, background="white"):
+    """
+    Rasterizes geometry into a square Pillow image, scaled to fit.
+
+    :param geometry: Geometry object
+    :param size: Width and height of the image in pixels (int)
+    :param margin: Blank border in pixels (int)
+    :param background: Background color
+    :return: PIL.Image.Image
+    """
+    from PIL import Image, ImageDraw
+    image = Image.new("RGB", (size, size), background)
+    draw = ImageDraw.Draw(image)
+
+    min_x, min_y, max_x, max_y = geometry.bounds
+    extent = max(max_x - min_x, max_y - min_y, 1e-9)
+    scale = (size - 2 * margin) / extent
+    offset_x = (size - scale * (max_x + min_x)) / 2
+    offset_y = (size + scale * (max_y + min_y)) / 2
+    # Thin the configured line width when the drawing is scaled down, but keep it visible.
+    line_width = max(1, round((geometry.width or 1) * min(scale, 1)))
+
+    # Draw every connected run of equally colored segments as one polyline,
+    # so the number of ImageDraw calls follows the runs instead of the segments.
+    coordinates, colors, palette = geometry.coordinates, geometry.colors, geometry.palette
+    points, color, end = [], None, None
+    for i in range(len(colors)):
+        x0, y0, x1, y1 = coordinates[4*i:4*i+4]
+        if colors[i] != color or (x0, y0) != end:
+            if points:
+                draw.line(points, fill=palette[color], width=line_width)
+            points, color = [offset_x + scale * x0, offset_y - scale * y0], colors[i]
+        points.extend((offset_x + scale * x1, offset_y - scale * y1))
+        end = (x1, y1)
+    if points:
+        draw.line(points, fill=palette[color], width=line_width)
+    return image
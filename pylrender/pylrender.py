@@ -8,17 +8,37 @@ from turtle import Turtle, Screen
 import json
 
 from utils import *
+from ensemble import generate_ensemble
+from export import export
 
 HISTORY_PATH = os.path.join(os.path.dirname(__file__), '../app/history.txt')
+ENSEMBLE_THUMBNAIL_SIZE = 128
+USAGE = 'Usage: python3 PyLRender [--export <filename> | --export-all <directory> | --ensemble <variants> <directory>]'
 
 class PyLRender:
     def __init__(self) -> None:
-        # Check for export option
+        # Check for export or ensemble option
         export_filename = None
         if len(sys.argv) == 3 and sys.argv[1] == '--export':
             export_filename = sys.argv[2]
+        elif len(sys.argv) == 3 and sys.argv[1] == '--export-all':
+            filename = input("Name of file containing l-system description: ")
+            iterations = int(input("Number of iterations: "))
+            lsystem = LSysConfigFileParser.parse(filename)
+            manifest = export(lsystem, iterations, sys.argv[2])
+            for artifact in manifest["artifacts"]:
+                print(f"{artifact['filename']}\t{artifact['bytes']} bytes\t{artifact['seconds']:.2f}s")
+            print(f"Exported {len(manifest['artifacts'])} artifact(s) in {manifest['seconds']:.2f}s.")
+            return
+        elif len(sys.argv) == 4 and sys.argv[1] == '--ensemble' and is_pos_int(sys.argv[2]):
+            filename = input("Name of file containing l-system description: ")
+            iterations = int(input("Number of iterations: "))
+            seed = input("Seed (leave empty for a random seed): ")
+            lsystem = LSysConfigFileParser.parse(filename)
+            PyLRender.export_ensemble(lsystem, iterations, int(sys.argv[2]), sys.argv[3], int(seed) if seed else None)
+            return
         elif len(sys.argv) != 1:
-            print('Usage: python3 PyLRender [--export <filename>]')
+            print(USAGE)
             return
 
         filename = input("Name of file containing l-system description: ")
@@ -45,6 +65,29 @@ class PyLRender:
         image = Image.open(io.BytesIO(screenshot.encode('utf-8')))
         image.save(export_filename)
 
+    @staticmethod
+    def export_ensemble(lsystem, iterations, variants, directory, seed=None):
+        """
+        Generates stochastic variants in parallel, writes their thumbnails if the L-System is drawable and prints length statistics.
+
+        :param lsystem: L-System to generate variants of (LSystem)
+        :param iterations: Number of iterations per variant (int)
+        :param variants: Number of variants (int)
+        :param directory: Directory to write thumbnails to
+        :param seed: Root seed (int) or None
+        """
+        # Thumbnails require translations, length statistics do not.
+        thumbnail_size = ENSEMBLE_THUMBNAIL_SIZE if lsystem.translations != None else None
+        ensemble = generate_ensemble(lsystem, iterations, variants, seed=seed, thumbnail_size=thumbnail_size)
+        os.makedirs(directory, exist_ok=True)
+        for variant in ensemble.variants:
+            if variant.thumbnail != None:
+                with open(os.path.join(directory, f"variant-{variant.index}.png"), 'wb') as f:
+                    f.write(variant.thumbnail)
+            print(f"variant {variant.index}\tseed {variant.seed}\tlength {variant.length}")
+        print(f"root seed {ensemble.seed}")
+        print("\t".join(f"{key} {value:.2f}" for key, value in ensemble.statistics().items()))
+
 BASE_CONFIG_KEYS = {"variables","constants","axiom","rules"}
 DEFAULT_WIDTH = 1
 SUPPORTED_OPERATIONS = ["nop","push","pop","angle","forward","draw","color"]
@@ -220,32 +263,44 @@ class LSystem:
         self.translations = translations
         self.width = width
 
-    def process(self, iterations):
+    def process(self, iterations, rng=random):
         """
         Applies reproduction rules to axiom a given amount of times.
 
         :param iterations: Number of iteratations to perform (int)
+        :param rng: Random number generator used for stochastic rules (random.Random or random module)
         :return current: Iterated L-System string
         """
 
         if not is_pos_int(iterations):
             raise ValueError("Unvalid number of iterations.")
 
+        current = self.expand(iterations, rng)
+        self.__log(iterations, current)
+        return current
+
+    def expand(self, iterations, rng=random):
+        """
+        Applies reproduction rules to axiom without logging the result to the history.
+
+        :param iterations: Number of iteratations to perform (int)
+        :param rng: Random number generator used for stochastic rules (random.Random or random module)
+        :return current: Iterated L-System string
+        """
         current = self.axiom
         for _ in range(int(iterations)):
-            next = ""
+            next = []
             for symbol in current:
                 if symbol in self.rules:
                     expansion = self.rules[symbol]
                     if isinstance(expansion, str):
-                        next += expansion
+                        next.append(expansion)
                     elif isinstance(expansion, list):
                         weights, outcomes = zip(*expansion)
-                        next += random.choices(outcomes, weights=[float(w) for w in weights], k=1)[0]
+                        next.append(rng.choices(outcomes, weights=[float(w) for w in weights], k=1)[0])
                 else:
-                    next += symbol
-            current = next
-        self.__log(iterations, current)
+                    next.append(symbol)
+            current = "".join(next)
         return current
 
     def __log(self, iterations, string):
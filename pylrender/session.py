@@ -0,0 +1,195 @@
+import random
+
+from utils import *
+
+class LSystemSession:
+    def __init__(self, lsystem, rng=random):
+        """
+        Initializes a new LSystemSession object for repeatedly expanding an L-System while editing it.
+
+        The session caches the expansion of every symbol at every depth it was
+        needed at, together with the generations it produced. Editing a rule only
+        invalidates the symbols that can reach the edited variable.
+
+        :param lsystem: L-System to edit and expand (LSystem)
+        :param rng: Random number generator used for stochastic rules (random.Random or random module)
+        """
+        self.lsystem = lsystem
+        self.rng = rng
+        self.expansions = {}
+        self.generations = {}
+        self.stochastic = self.__stochastic_symbols()
+
+    def dependencies(self, variable):
+        """
+        Returns the symbols a variable's rule can produce.
+
+        :param variable: L-System variable (str)
+        :return: Set of symbols
+        """
+        rule = self.lsystem.rules[variable]
+        if isinstance(rule, str):
+            return set(rule)
+        return set().union(*(set(outcome) for _, outcome in rule))
+
+    def dependents(self, variable):
+        """
+        Returns the variables whose expansion can contain the given variable's rule.
+
+        :param variable: L-System variable (str)
+        :return: Set of variables, including the variable itself
+        """
+        reverse = {}
+        for symbol in self.lsystem.rules:
+            for dependency in self.dependencies(symbol):
+                reverse.setdefault(dependency, set()).add(symbol)
+
+        reached = {variable}
+        pending = [variable]
+        while pending:
+            for dependent in reverse.get(pending.pop(), ()):
+                if dependent not in reached:
+                    reached.add(dependent)
+                    pending.append(dependent)
+        return reached
+
+    def expand(self, iterations):
+        """
+        Applies reproduction rules to axiom a given amount of times, reusing cached expansions.
+
+        :param iterations: Number of iteratations to perform (int)
+        :return: Iterated L-System string
+        """
+        if not is_pos_int(iterations):
+            raise ValueError("Unvalid number of iterations.")
+
+        iterations = int(iterations)
+        if iterations in self.generations:
+            return self.generations[iterations]
+
+        current = "".join(self.expansion(symbol, iterations) for symbol in self.lsystem.axiom)
+        if not self.stochastic.intersection(self.lsystem.axiom):
+            self.generations[iterations] = current
+        return current
+
+    def expansion(self, symbol, depth):
+        """
+        Returns a symbol expanded a given amount of times.
+
+        :param symbol: L-System symbol (str)
+        :param depth: Number of times to apply the reproduction rules (int)
+        :return: Expanded string
+        """
+        if symbol not in self.lsystem.rules or depth == 0:
+            return symbol
+
+        if symbol in self.stochastic:
+            rule = self.lsystem.rules[symbol]
+            if isinstance(rule, list):
+                weights, outcomes = zip(*rule)
+                rule = self.rng.choices(outcomes, weights=[float(w) for w in weights], k=1)[0]
+            return "".join(self.expansion(child, depth - 1) for child in rule)
+
+        cached = self.expansions.setdefault(symbol, [symbol])
+        if len(cached) <= depth:
+            self.__fill(symbol, depth)
+        return cached[depth]
+
+    def set_rule(self, variable, rule):
+        """
+        Replaces the rule of a variable and invalidates the cached expansions depending on it.
+
+        :param variable: L-System variable (str)
+        :param rule: Reproduction string or list of [weight, string] outcomes
+        :return: Set of variables whose cached expansions were invalidated
+        """
+        if variable not in self.lsystem.variables:
+            raise ValueError(f"Undefined L-System variable '{variable}'.")
+
+        outcomes = [rule] if isinstance(rule, str) else [outcome for _, outcome in rule]
+        if not all(set(outcome).issubset(self.lsystem.alphabet) for outcome in outcomes):
+            raise ValueError(f"Undefined symbol in L-System rule '{rule}'.")
+
+        # Paths towards the edited variable do not depend on its own rule, so
+        # the affected variables are the same before and after the edit.
+        invalidated = self.dependents(variable)
+        self.lsystem.rules[variable] = rule
+        for symbol in invalidated:
+            self.expansions.pop(symbol, None)
+        self.generations.clear()
+        self.stochastic = self.__stochastic_symbols()
+        return invalidated
+
+    def set_axiom(self, axiom):
+        """
+        Replaces the axiom. Cached symbol expansions stay valid.
+
+        :param axiom: L-System axiom (str)
+        """
+        if not set(axiom).issubset(self.lsystem.alphabet):
+            raise ValueError(f"Undefined symbol in L-System axiom '{axiom}'.")
+
+        self.lsystem.axiom = axiom
+        self.generations.clear()
+
+    def update(self, lsystem):
+        """
+        Applies the differences between the session's L-System and an edited version of it,
+        e.g. the result of parsing the edited configuration file again.
+
+        :param lsystem: Edited L-System (LSystem)
+        :return: Set of variables whose cached expansions were invalidated
+        """
+        if lsystem.alphabet != self.lsystem.alphabet or set(lsystem.variables) != set(self.lsystem.variables):
+            invalidated = set(self.expansions)
+            self.lsystem = lsystem
+            self.expansions.clear()
+            self.generations.clear()
+            self.stochastic = self.__stochastic_symbols()
+            return invalidated
+
+        invalidated = set()
+        for variable, rule in lsystem.rules.items():
+            if self.lsystem.rules[variable] != rule:
+                invalidated.update(self.set_rule(variable, rule))
+        if self.lsystem.axiom != lsystem.axiom:
+            self.set_axiom(lsystem.axiom)
+        self.lsystem.translations = lsystem.translations
+        self.lsystem.width = lsystem.width
+        return invalidated
+
+    def __fill(self, symbol, depth):
+        """
+        Extends the cached expansions of a deterministic symbol and everything it produces up to depth.
+        """
+        reachable = [symbol]
+        seen = {symbol}
+        for current in reachable:
+            for dependency in self.dependencies(current):
+                if dependency in self.lsystem.rules and dependency not in seen:
+                    seen.add(dependency)
+                    reachable.append(dependency)
+
+        for current in reachable:
+            self.expansions.setdefault(current, [current])
+
+        # Build level by level so every expansion joins already cached expansions of the previous level.
+        for level in range(1, depth + 1):
+            for current in reachable:
+                cached = self.expansions[current]
+                if len(cached) == level:
+                    previous = level - 1
+                    cached.append("".join(
+                        self.expansions[child][previous] if child in self.lsystem.rules else child
+                        for child in self.lsystem.rules[current]
+                    ))
+
+    def __stochastic_symbols(self):
+        """
+        Returns the variables that have a stochastic rule or can produce a variable that has one.
+        """
+        stochastic = set()
+        for variable, rule in self.lsystem.rules.items():
+            if isinstance(rule, list):
+                stochastic.update(self.dependents(variable))
+        return stochastic
@@ -0,0 +1,103 @@
+import gzip
+import struct
+import importlib
+from array import array
+
+import pytest
+
+flask = pytest.importorskip("flask")
+
+webapp = importlib.import_module("app.app")
+from app.geometry import *
+from pylrender.geometry import HEADER_FORMAT
+
+RECORD_FIELDS = [
+    "2023-05-01 12:00:00.000000",
+    "F",
+    "+, -, O, B",
+    "F",
+    "F -> F+OF-BF",
+    "F : draw 20, + : angle 90, - : angle -90, O : color orange, B : color 0 0 255",
+    "2"
+]
+
+class TestGeometryPayload:
+    @staticmethod
+    def test_parse_translations():
+        """
+        Test that logged translations are parsed into a symbol to translation dictionary, including RGB colors.
+        """
+        translations = parse_translations("F : draw 20, [ : push, B : color 0 0 255, P : color #A233FF")
+        assert translations == {"F" : "draw 20", "[" : "push", "B" : "color 0 0 255", "P" : "color #A233FF"}
+
+    @staticmethod
+    def test_rgb_color_palette():
+        """
+        Test that RGB colors are converted to CSS colors in the palette.
+        """
+        geometry = build_geometry("BF", "F : draw 20, B : color 0 0 255")
+        assert geometry.palette == ["black", "rgb(0, 0, 255)"]
+        assert list(geometry.colors) == [1]
+
+    @staticmethod
+    def test_payload_layout():
+        """
+        Test that the payload holds the header, then Float32 coordinates, then Uint16 palette indices.
+        """
+        geometry = build_geometry("F+OF-BF", RECORD_FIELDS[5])
+        payload = geometry.to_bytes()
+        header_size = struct.calcsize(HEADER_FORMAT)
+        count, *bounds = struct.unpack_from(HEADER_FORMAT, payload)
+        assert count == 3
+        assert bounds == pytest.approx(geometry.bounds)
+
+        coordinates = array("f", payload[header_size:header_size + 16 * count])
+        colors = array("H", payload[header_size + 16 * count:])
+        assert list(coordinates) == pytest.approx([0, 0, 20, 0, 20, 0, 20, 20, 20, 20, 40, 20])
+        assert list(colors) == [0, 1, 2]
+
+class TestGeometryEndpoint:
+    @staticmethod
+    @pytest.fixture
+    def client(tmp_path, monkeypatch):
+        history_path = tmp_path / "history.txt"
+        history_path.write_text("\t".join(RECORD_FIELDS + ["F+OF-BF"]) + "\n")
+        monkeypatch.setattr(webapp, "HISTORY_PATH", str(history_path))
+        webapp.encoded_geometry.cache_clear()
+        return webapp.app.test_client()
+
+    @staticmethod
+    def test_gzip_negotiation(client):
+        """
+        Test that the payload is gzip encoded only for clients accepting gzip.
+        """
+        compressed = client.get("/geometry", headers={"Accept-Encoding" : "gzip"})
+        assert compressed.headers["Content-Encoding"] == "gzip"
+        plain = client.get("/geometry", headers={"Accept-Encoding" : "identity"})
+        assert "Content-Encoding" not in plain.headers
+        assert gzip.decompress(compressed.data) == plain.data
+        assert compressed.headers["ETag"] != plain.headers["ETag"]
+
+    @staticmethod
+    def test_etag_revalidation(client):
+        """
+        Test that revalidating with a matching ETag returns 304 without a body.
+        """
+        response = client.get("/geometry", headers={"Accept-Encoding" : "gzip"})
+        assert response.status_code == 200
+        etag = response.headers["ETag"]
+        revalidated = client.get("/geometry", headers={"Accept-Encoding" : "gzip", "If-None-Match" : etag})
+        assert revalidated.status_code == 304
+        assert revalidated.data == b""
+
+    @staticmethod
+    def test_etag_changes_with_history(client, monkeypatch):
+        """
+        Test that appending a record to the history changes the ETag and the served geometry.
+        """
+        first = client.get("/geometry")
+        with open(webapp.HISTORY_PATH, 'a') as f:
+            f.write("\t".join(RECORD_FIELDS + ["F"]) + "\n")
+        second = client.get("/geometry", headers={"If-None-Match" : first.headers["ETag"]})
+        assert second.status_code == 200
+        assert struct.unpack_from(HEADER_FORMAT, second.data)[0] == 1
@@ -1,12 +1,24 @@
 import os
+import sys
+import ast
 import re
 import tempfile
 import json
+import random
+import struct
+import zipfile
 from copy import deepcopy
+from concurrent.futures import ProcessPoolExecutor
 
 import pytest
 
 from pylrender.pylrender import *
+from pylrender.ensemble import *
+from pylrender.backup import *
+from pylrender.session import *
+from pylrender.geometry import *
+from pylrender.analysis import *
+from pylrender.export import *
 
 def get_lsys_description(
         variables = ["F","G"],
@@ -291,3 +303,497 @@ class TestLSysHistory:
         with open(HISTORY_PATH, 'r') as f:
             number_of_entries_after = len(f.readlines()) 
         assert number_of_entries_after == number_of_entries_before + 2
+
+class TestLSysEnsemble:
+    @staticmethod
+    @pytest.fixture
+    def lsys():
+        return LSystem(
+            variables=["F"],
+            constants=["+","-","[","]"],
+            axiom="F",
+            rules={"F" : [["0.33","F[+F]F[-F]F"], [0.33,"F[+F]F"], ["0.34","F[-F]F"]]},
+            translations={"F" : "draw 20", "+" : "angle 25", "-" : "angle -25", "[" : "push", "]" : "pop"}
+        )
+
+    @staticmethod
+    def test_spawned_seeds_reproducible():
+        """
+        Test that spawning seeds from the same root seed yields the same distinct child seeds.
+        """
+        root, seeds = spawn_seeds(42, 50)
+        assert root == 42
+        assert seeds == spawn_seeds(42, 50)[1]
+        assert len(set(seeds)) == 50
+        assert seeds != spawn_seeds(43, 50)[1]
+
+    @staticmethod
+    def test_ensemble_reproducible(lsys):
+        """
+        Test that ensembles with the same root seed match and that every variant can be regenerated from its seed.
+        """
+        ensemble = generate_ensemble(lsys, 4, 8, seed=7, workers=2)
+        again = generate_ensemble(lsys, 4, 8, seed=7, workers=3)
+        assert [variant.length for variant in ensemble.variants] == [variant.length for variant in again.variants]
+        for variant in ensemble.variants:
+            assert len(generate_variant(lsys, 4, variant.seed)) == variant.length
+
+    @staticmethod
+    def test_ensemble_statistics(lsys):
+        """
+        Test that ensemble statistics summarize the variant output lengths.
+        """
+        ensemble = generate_ensemble(lsys, 3, 10, seed=1, workers=2)
+        lengths = [variant.length for variant in ensemble.variants]
+        stats = ensemble.statistics()
+        assert stats["min"] == min(lengths)
+        assert stats["max"] == max(lengths)
+        assert stats["mean"] == pytest.approx(sum(lengths) / len(lengths))
+
+    @staticmethod
+    def test_invalid_number_of_variants(lsys):
+        """
+        Test that generating an ensemble without a positive number of variants raises ValueError.
+        """
+        with pytest.raises(ValueError):
+            generate_ensemble(lsys, 3, 0)
+
+    @staticmethod
+    def test_ensemble_thumbnails(lsys):
+        """
+        Test that every variant gets a PNG thumbnail when a thumbnail size is given.
+        """
+        pytest.importorskip("PIL")
+        ensemble = generate_ensemble(lsys, 2, 3, seed=3, workers=1, thumbnail_size=32)
+        assert all(variant.thumbnail.startswith(b"\x89PNG") for variant in ensemble.variants)
+
+    @staticmethod
+    def test_export_ensemble_without_translations(tmp_path, capsys):
+        """
+        Test that ensembles of non-drawable L-Systems still report length statistics without writing thumbnails.
+        """
+        lsys = LSystem(variables=["F"], constants=[], axiom="F", rules={"F" : [["0.5","FF"],["0.5","F"]]})
+        PyLRender.export_ensemble(lsys, 3, 4, str(tmp_path), seed=5)
+        assert "mean" in capsys.readouterr().out
+        assert os.listdir(tmp_path) == []
+
+def backup_files(history_backup):
+    return sorted(name for name in os.listdir(history_backup.backup_dir) if name.endswith(".gz"))
+
+class TestLSysBackup:
+    @staticmethod
+    @pytest.fixture
+    def setup(tmp_path):
+        history_path = tmp_path / "history.txt"
+        history_path.write_text("")
+        history_backup = HistoryBackup(backup_dir=str(tmp_path / "backups"), history_path=str(history_path), retention=3)
+        def append(*strings):
+            with open(history_path, 'a', encoding='utf-8', newline='') as f:
+                for string in strings:
+                    f.write(f"2023-05-01 12:00:00.000000\tF\t+\tF\tF -> F+F\tF : draw 10, + : angle 90\t1\t{string}\n")
+        return history_backup, history_path, append
+
+    @staticmethod
+    def test_incremental_backup(setup):
+        """
+        Test that every backup only stores the records appended since the previous backup.
+        """
+        history_backup, _, append = setup
+        append("F+F", "F+F+F+F")
+        assert history_backup.backup()["records"] == 2
+        assert history_backup.backup() == None
+        append("F")
+        assert history_backup.backup()["records"] == 1
+
+    @staticmethod
+    def test_identical_strings_deduplicated(setup):
+        """
+        Test that identical resulting strings are stored once in the object store.
+        """
+        history_backup, _, append = setup
+        append("F+F", "F+F")
+        history_backup.backup()
+        append("F+F")
+        history_backup.backup()
+        assert len(os.listdir(history_backup.objects_dir)) == 1
+
+    @staticmethod
+    def test_restore_replays_segments(setup):
+        """
+        Test that restoring replays the segments up to the chosen restore point.
+        """
+        history_backup, history_path, append = setup
+        append("F+F")
+        first = history_backup.backup()
+        append("F+F+F+F")
+        history_backup.backup()
+        complete_history = history_path.read_text()
+
+        history_path.write_text("")
+        assert history_backup.restore() == 2
+        assert history_path.read_text() == complete_history
+        assert history_backup.restore(first["name"]) == 1
+        assert history_path.read_text() == complete_history.splitlines(keepends=True)[0]
+
+    @staticmethod
+    def test_restore_keeps_unicode_line_separators(setup):
+        """
+        Test that records containing unicode line separators are backed up and restored as single records.
+        """
+        history_backup, history_path, append = setup
+        append("F\u2028F", "F\x85F\x0cF\rF")
+        assert history_backup.backup()["records"] == 2
+        complete_history = history_path.read_bytes()
+
+        history_path.write_text("")
+        assert history_backup.restore() == 2
+        assert history_path.read_bytes() == complete_history
+
+    @staticmethod
+    def test_retention(setup):
+        """
+        Test that only the retained restore points are listed and the chain is compacted once it holds twice as many.
+        """
+        history_backup, history_path, append = setup
+        for i in range(5):
+            append("F" * (i + 1))
+            history_backup.backup()
+        assert [segment["name"] for segment in history_backup.segments()] == ["segment-000003.gz", "segment-000004.gz", "segment-000005.gz"]
+        assert len(backup_files(history_backup)) == 5
+        with pytest.raises(FileNotFoundError):
+            history_backup.restore("segment-000001.gz")
+
+        append("FFFFFF")
+        history_backup.backup()
+        assert backup_files(history_backup) == ["base-000006.gz", "segment-000005.gz", "segment-000006.gz"]
+        complete_history = history_path.read_text()
+        assert history_backup.restore("segment-000004.gz") == 4
+        assert history_path.read_text() == "".join(complete_history.splitlines(keepends=True)[:4])
+        assert history_backup.restore() == 6
+        assert history_path.read_text() == complete_history
+
+        # Replacing the history starts a new base, after which the old chain is no longer needed.
+        history_path.write_text("")
+        for i in range(3):
+            append("G" * (i + 1))
+            history_backup.backup()
+        assert backup_files(history_backup) == ["segment-000007.gz", "segment-000008.gz", "segment-000009.gz"]
+        assert len(os.listdir(history_backup.objects_dir)) == 3
+
+    @staticmethod
+    def test_retention_bounds_append_only_backups(setup):
+        """
+        Test that appending and backing up repeatedly keeps fewer than twice 'retention' segments while restoring the full history.
+        """
+        history_backup, history_path, append = setup
+        for i in range(20):
+            append("F" * (i + 1))
+            history_backup.backup()
+            assert len(backup_files(history_backup)) < 2 * history_backup.retention
+
+        complete_history = history_path.read_text()
+        history_path.write_text("")
+        assert history_backup.restore() == 20
+        assert history_path.read_text() == complete_history
+        assert len(os.listdir(history_backup.objects_dir)) == 20
+
+    @staticmethod
+    def test_interrupted_compaction(setup, monkeypatch):
+        """
+        Test that the backup stays restorable when removing compacted segments is interrupted.
+        """
+        history_backup, history_path, append = setup
+        for i in range(5):
+            append("F" * (i + 1))
+            history_backup.backup()
+
+        def interrupted(path):
+            raise OSError("Interrupted.")
+        monkeypatch.setattr(os, "remove", interrupted)
+        append("FFFFFF")
+        with pytest.raises(OSError):
+            history_backup.backup()
+        monkeypatch.undo()
+
+        complete_history = history_path.read_text()
+        history_path.write_text("")
+        assert history_backup.restore() == 6
+        assert history_path.read_text() == complete_history
+
+class TestLSysSession:
+    @staticmethod
+    @pytest.fixture
+    def lsys():
+        return LSystem(variables=["A","B","C"], constants=["+"], axiom="A+C", rules={"A":"AB","B":"A","C":"C+C"})
+
+    @staticmethod
+    def test_session_matches_process(lsys):
+        """
+        Test that a session expands to the same string as the L-System itself.
+        """
+        session = LSystemSession(deepcopy(lsys))
+        assert session.expand(6) == lsys.expand(6)
+        assert session.expand(3) == lsys.expand(3)
+
+    @staticmethod
+    def test_dependents(lsys):
+        """
+        Test that the dependents of a variable are exactly the variables that can reach its rule.
+        """
+        session = LSystemSession(lsys)
+        assert session.dependents("B") == {"A","B"}
+        assert session.dependents("C") == {"C"}
+
+    @staticmethod
+    def test_rule_edit_invalidates_dependents_only(lsys):
+        """
+        Test that editing a rule only invalidates the variables reaching it and yields the same string as a fresh expansion.
+        """
+        session = LSystemSession(lsys)
+        session.expand(5)
+        cached_c = session.expansions["C"]
+        assert session.set_rule("B", "AA") == {"A","B"}
+        assert session.expansions["C"] is cached_c
+        fresh = LSystem(variables=["A","B","C"], constants=["+"], axiom="A+C", rules={"A":"AB","B":"AA","C":"C+C"})
+        assert session.expand(5) == fresh.expand(5)
+
+    @staticmethod
+    def test_axiom_edit_keeps_expansions(lsys):
+        """
+        Test that editing the axiom keeps the cached symbol expansions.
+        """
+        session = LSystemSession(lsys)
+        session.expand(4)
+        cached = dict(session.expansions)
+        session.set_axiom("C+A")
+        assert session.expand(4) == session.expansion("C", 4) + "+" + session.expansion("A", 4)
+        assert all(session.expansions[symbol] is cached[symbol] for symbol in cached)
+
+    @staticmethod
+    def test_update_with_edited_lsystem(lsys):
+        """
+        Test that updating a session with an edited L-System only invalidates the variables reaching the edited rules.
+        """
+        session = LSystemSession(deepcopy(lsys))
+        session.expand(4)
+        edited = deepcopy(lsys)
+        edited.rules["C"] = "CC"
+        edited.axiom = "C"
+        assert session.update(edited) == {"C"}
+        assert session.expand(4) == edited.expand(4)
+
+    @staticmethod
+    def test_invalid_rule_edit(lsys):
+        """
+        Test that editing a rule with undefined symbols raises ValueError.
+        """
+        session = LSystemSession(lsys)
+        with pytest.raises(ValueError):
+            session.set_rule("A", "AQ")
+
+    @staticmethod
+    def test_stochastic_rules_not_cached():
+        """
+        Test that variables reaching a stochastic rule are expanded without caching.
+        """
+        lsys = LSystem(variables=["A","B"], constants=[], axiom="AB", rules={"A":"AB","B":[["0.5","B"],["0.5","BB"]]})
+        session = LSystemSession(lsys, random.Random(3))
+        assert session.stochastic == {"A","B"}
+        string = session.expand(4)
+        assert set(string) == {"A","B"}
+        assert session.expansions == {} and session.generations == {}
+
+class TestLSysAnalysis:
+    @staticmethod
+    @pytest.fixture
+    def lsys():
+        return LSystem(
+            variables=["X","F"],
+            constants=["+","-","[","]"],
+            axiom="X",
+            rules={"X" : "F+[[X]-X]-F[-FX]+X", "F" : "FF"},
+            translations={"X" : "nop", "F" : "draw 10", "+" : "angle 25", "-" : "angle -25", "[" : "push", "]" : "pop"}
+        )
+
+    @staticmethod
+    def test_bounds_match_geometry(lsys):
+        """
+        Test that the bounding box computed from symbol transforms matches interpreting the iterated string.
+        """
+        analysis = LSystemAnalysis(lsys)
+        geometry = build_geometry(lsys, lsys.expand(5))
+        assert analysis.bounds(5) == pytest.approx(geometry.bounds, abs=1e-6)
+
+    @staticmethod
+    def test_uneven_heading_step():
+        """
+        Test that the number of headings is exact for an angle whose step does not divide 360 evenly as a float.
+        """
+        angle = 360 / 255 * 7
+        lsys = LSystem(variables=["F"], constants=["+","-"], axiom="F", rules={"F" : "F+F-F+F"}, translations={"F" : "draw 10", "+" : f"angle {angle}", "-" : f"angle {-angle}"})
+        analysis = LSystemAnalysis(lsys)
+        assert analysis.headings == 255
+        geometry = build_geometry(lsys, lsys.expand(4))
+        assert analysis.bounds(4) == pytest.approx(geometry.bounds, abs=1e-3)
+
+    @staticmethod
+    def test_endpoint():
+        """
+        Test that the endpoint computed from symbol transforms matches the Koch curve's known endpoint.
+        """
+        lsys = LSystem(variables=["F"], constants=["+","-"], axiom="F+", rules={"F" : "F+F-F-F+F"}, translations={"F" : "draw 10", "+" : "angle 90", "-" : "angle -90"})
+        x, y, heading = LSystemAnalysis(lsys).endpoint(4)
+        assert (x, y) == pytest.approx((10 * 3**4, 0), abs=1e-6)
+        assert heading == 90
+
+    @staticmethod
+    def test_headings(lsys):
+        """
+        Test that headings are discretized by the greatest common divisor of the angles and 360 degrees.
+        """
+        analysis = LSystemAnalysis(lsys)
+        assert analysis.heading_step == 5
+        assert analysis.headings == 72
+
+    @staticmethod
+    def test_viewport_culling(lsys):
+        """
+        Test that building geometry for a viewport keeps every segment inside it and skips subtrees outside it.
+        """
+        analysis = LSystemAnalysis(lsys)
+        full = analysis.geometry(5)
+        assert len(full) == len(build_geometry(lsys, lsys.expand(5)))
+
+        min_x, min_y, max_x, max_y = full.bounds
+        viewport = (min_x, min_y, (min_x + max_x) / 2, (min_y + max_y) / 2)
+        culled = analysis.geometry(5, viewport)
+        inside = [segment for segment in full.segments() if intersects((min(segment[0], segment[2]), min(segment[1], segment[3]), max(segment[0], segment[2]), max(segment[1], segment[3])), 0, 0, viewport)]
+        assert len(inside) <= len(culled) < len(full)
+        assert set(inside).issubset(set(culled.segments()))
+
+    @staticmethod
+    def test_stochastic_lsystem():
+        """
+        Test that analysing a stochastic L-System raises ValueError.
+        """
+        lsys = LSystem(variables=["F"], constants=[], axiom="F", rules={"F" : [["0.5","FF"],["0.5","F"]]}, translations={"F" : "draw 10"})
+        with pytest.raises(ValueError):
+            LSystemAnalysis(lsys)
+
+    @staticmethod
+    def test_unbalanced_push_pop():
+        """
+        Test that analysing an L-System with unbalanced push/pop raises ValueError.
+        """
+        lsys = LSystem(variables=["F"], constants=["]"], axiom="F", rules={"F" : "F]"}, translations={"F" : "draw 10", "]" : "pop"})
+        with pytest.raises(ValueError):
+            LSystemAnalysis(lsys).bounds(2)
+
+class TestLSysExport:
+    @staticmethod
+    @pytest.fixture
+    def geometry():
+        lsys = LSystem(variables=["F"], constants=["+","X"], axiom="F", rules={"F" : "F+FX"}, translations={"F" : "draw 10", "+" : "angle 90", "X" : "color 0 0 255"})
+        return build_geometry(lsys, lsys.expand(3))
+
+    @staticmethod
+    def test_manifest(geometry, tmp_path):
+        """
+        Test that every written artifact is described in the manifest.
+        """
+        targets = [ExportTarget("svg", "lsystem.svg"), ExportTarget("npz", "lsystem.npz")]
+        manifest = export_geometry(geometry, str(tmp_path), targets)
+        with open(tmp_path / MANIFEST_FILENAME, 'r') as f:
+            assert json.load(f)["artifacts"] == manifest["artifacts"]
+        assert manifest["segments"] == len(geometry)
+        for artifact in manifest["artifacts"]:
+            assert os.path.getsize(tmp_path / artifact["filename"]) == artifact["bytes"]
+
+    @staticmethod
+    def test_svg_paths(geometry, tmp_path):
+        """
+        Test that the SVG export draws one path per run of equally colored segments.
+        """
+        export_geometry(geometry, str(tmp_path), [ExportTarget("svg", "lsystem.svg")])
+        svg = (tmp_path / "lsystem.svg").read_text()
+        runs = 1 + sum(1 for a, b in zip(geometry.colors, geometry.colors[1:]) if a != b)
+        assert svg.count("<path") == runs
+        assert 'stroke="rgb(0, 0, 255)"' in svg
+
+    @staticmethod
+    def test_npz_layout(geometry, tmp_path):
+        """
+        Test that the .npz export contains NumPy arrays with the segment buffers.
+        """
+        export_geometry(geometry, str(tmp_path), [ExportTarget("npz", "lsystem.npz")])
+        with zipfile.ZipFile(tmp_path / "lsystem.npz") as archive:
+            assert sorted(archive.namelist()) == ["bounds.npy", "colors.npy", "palette.npy", "segments.npy"]
+            data = archive.read("segments.npy")
+        header_length = struct.unpack("<H", data[8:10])[0]
+        header = ast.literal_eval(data[10:10 + header_length].decode("latin1"))
+        assert header["shape"] == (len(geometry), 4)
+        assert (10 + header_length) % 64 == 0
+        assert data[10 + header_length:] == geometry.coordinates.tobytes()
+
+    @staticmethod
+    def test_process_pool(geometry, tmp_path, monkeypatch):
+        """
+        Test that targets are written by a process pool that receives the geometry once per worker.
+        """
+        module = sys.modules[export_geometry.__module__]
+        pools = []
+        class RecordingPool(ProcessPoolExecutor):
+            def __init__(self, **kwargs):
+                pools.append(kwargs)
+                super().__init__(**kwargs)
+        monkeypatch.setattr(module, "ProcessPoolExecutor", RecordingPool)
+        monkeypatch.setattr(os, "cpu_count", lambda: 4)
+
+        targets = [ExportTarget("svg", "lsystem.svg"), ExportTarget("npz", "lsystem.npz")]
+        manifest = export_geometry(geometry, str(tmp_path), targets)
+        assert len(pools) == 1
+        assert pools[0]["max_workers"] == 2
+        assert pools[0]["initargs"] == (geometry, str(tmp_path))
+        assert [artifact["filename"] for artifact in manifest["artifacts"]] == ["lsystem.svg", "lsystem.npz"]
+        assert all((tmp_path / target.filename).exists() for target in targets)
+
+    @staticmethod
+    def test_single_worker_writes_serially(geometry, tmp_path, monkeypatch):
+        """
+        Test that a single worker writes the targets without starting a process pool.
+        """
+        module = sys.modules[export_geometry.__module__]
+        def unexpected_pool(**kwargs):
+            raise AssertionError("Unexpected process pool.")
+        monkeypatch.setattr(module, "ProcessPoolExecutor", unexpected_pool)
+        manifest = export_geometry(geometry, str(tmp_path), [ExportTarget("svg", "lsystem.svg"), ExportTarget("npz", "lsystem.npz")], workers=1)
+        assert len(manifest["artifacts"]) == 2
+
+    @staticmethod
+    def test_export_fits_deterministic_with_analysis(tmp_path):
+        """
+        Test that exporting a deterministic L-System fits it with the bounds computed by LSystemAnalysis.
+        """
+        lsys = LSystem(variables=["F"], constants=["+","-"], axiom="F", rules={"F" : "F+F-F-F+F"}, translations={"F" : "draw 10", "+" : "angle 90", "-" : "angle -90"})
+        manifest = export(lsys, 3, str(tmp_path), [ExportTarget("npz", "lsystem.npz")])
+        assert manifest["bounds"] == list(LSystemAnalysis(lsys).bounds(3))
+        assert manifest["bounds"] == pytest.approx(list(build_geometry(lsys, lsys.expand(3)).bounds), abs=1e-6)
+
+    @staticmethod
+    def test_export_measures_stochastic(tmp_path):
+        """
+        Test that exporting a stochastic L-System measures the bounds of the interpreted drawing.
+        """
+        lsys = LSystem(variables=["F"], constants=["+"], axiom="F", rules={"F" : [["0.5", "F+F"], ["0.5", "FF"]]}, translations={"F" : "draw 10", "+" : "angle 90"})
+        manifest = export(lsys, 3, str(tmp_path), [ExportTarget("npz", "lsystem.npz")])
+        assert manifest["segments"] == 8
+        assert manifest["bounds"][2] > 0
+
+    @staticmethod
+    def test_unsupported_format():
+        """
+        Test that an unsupported export format raises ValueError.
+        """
+        with pytest.raises(ValueError):
+            ExportTarget("gif", "lsystem.gif")
+